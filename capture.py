@@ -0,0 +1,64 @@
+from enum import IntEnum
+from socket import inet_aton, inet_ntoa
+from typing import Iterator, Tuple
+import json
+import struct
+import time
+
+
+class RecordKind(IntEnum):
+    SNAPSHOT = 0
+    QUERY = 1
+    RESPONSE = 2
+    UPSTREAM_QUERY = 3
+
+
+class Capture:
+    """Binary log of client queries, upstream queries and upstream responses.
+
+    The log starts with MAGIC followed by records: a RECORD header (kind, timestamp,
+    data length, IPv4 address, port) and the raw data. The first record is a snapshot
+    of the caches, so a replay starts from the same state as the captured server.
+    """
+    MAGIC = b'DNSCAP\x00\x01'
+    RECORD = struct.Struct('>BdI4sH')
+
+    def __init__(self, file_name: str):
+        self.file = open(file_name, 'wb')
+        self.file.write(self.MAGIC)
+
+    def write_snapshot(self, a_records_cache: dict, ns_records_cache: dict) -> None:
+        data = json.dumps([a_records_cache, ns_records_cache]).encode('utf-8')
+        self._write(RecordKind.SNAPSHOT, data, ('0.0.0.0', 0))
+
+    def write_query(self, data: bytes, address: Tuple[str, int]) -> None:
+        self._write(RecordKind.QUERY, data, address)
+
+    def write_upstream_query(self, data: bytes, address: Tuple[str, int]) -> None:
+        self._write(RecordKind.UPSTREAM_QUERY, data, address)
+
+    def write_response(self, data: bytes, address: Tuple[str, int]) -> None:
+        self._write(RecordKind.RESPONSE, data, address)
+
+    def _write(self, kind: RecordKind, data: bytes, address: Tuple[str, int]) -> None:
+        self.file.write(self.RECORD.pack(kind, time.time(), len(data), inet_aton(address[0]), address[1]))
+        self.file.write(data)
+
+    def close(self) -> None:
+        self.file.close()
+
+    @staticmethod
+    def read(file_name: str) -> Iterator[Tuple[RecordKind, float, bytes, Tuple[str, int]]]:
+        with open(file_name, 'rb') as file:
+            if file.read(len(Capture.MAGIC)) != Capture.MAGIC:
+                raise ValueError('{} is not a capture file'.format(file_name))
+            while True:
+                # a server stopped in the middle of a write leaves a truncated last record
+                header = file.read(Capture.RECORD.size)
+                if len(header) != Capture.RECORD.size:
+                    break
+                kind, timestamp, length, ip_address, port = Capture.RECORD.unpack(header)
+                data = file.read(length)
+                if len(data) != length:
+                    break
+                yield RecordKind(kind), timestamp, data, (inet_ntoa(ip_address), port)
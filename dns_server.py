@@ -1,10 +1,12 @@
 import os.path
 from socket import socket, AF_INET, SOCK_DGRAM, timeout
 import time
-from typing import List
+from typing import Callable, List, Optional, Sequence
 import json
 
 from message.message_format import Message
+from local_zone import LocalZone
+from capture import Capture
 from message.flags import RCode
 from message.flags import *
 
@@ -14,10 +16,22 @@ class DNSServer:
     A_RECORDS_CACHE_FILE_NAME = 'a_records_cache.txt'
     NS_RECORDS_CACHE_FILE_NAME = 'ns_records_cache.txt'
 
-    def __init__(self, port: int = 53):
-        self.sock = socket(AF_INET, SOCK_DGRAM)
+    def __init__(self,
+                 port: int = 53,
+                 local_files: Sequence[str] = (),
+                 capture_file: Optional[str] = None,
+                 sock=None,
+                 clock: Callable[[], float] = time.time):
         self.a_records_cache = {}
         self.ns_records_cache = {}
+        self.clock = clock
+        self.local_zone = LocalZone(local_files, clock)
+        self.capture_file = capture_file
+        self.capture = None
+        if sock is not None:
+            self.sock = sock
+            return
+        self.sock = socket(AF_INET, SOCK_DGRAM)
         try:
             self.sock.bind(('', port))
         except Exception:
@@ -27,7 +41,16 @@ class DNSServer:
     def start(self) -> None:
         self._load_cache()
         print('LOAD CACHE')
-        self._run()
+        self.local_zone.load()
+        print('LOAD LOCAL FILES')
+        if self.capture_file:
+            self.capture = Capture(self.capture_file)
+            self.capture.write_snapshot(self.a_records_cache, self.ns_records_cache)
+        try:
+            self._run()
+        finally:
+            if self.capture is not None:
+                self.capture.close()
 
     def _load_cache(self):
         root_servers = self._load(self.ROOT_SERVERS_FILE_NAME)
@@ -49,7 +72,7 @@ class DNSServer:
             return json.loads(file.readline())
 
     def _remove_expired_records(self):
-        current_time = time.time()
+        current_time = self.clock()
         for zone_name, ns_time_pairs in self.ns_records_cache.items():
             self.ns_records_cache[zone_name] = [ns_time_pair for ns_time_pair in ns_time_pairs
                                                 if ns_time_pair[1] > current_time or ns_time_pair[1] == -1]
@@ -63,6 +86,14 @@ class DNSServer:
             print('*' * 50)
             question, client_address = self.sock.recvfrom(512)
             print("{} SEND QUERY".format(client_address))
+            if self.capture is not None:
+                self.capture.write_query(question, client_address)
+            self.local_zone.reload_if_changed()
+            local_response = self.local_zone.lookup(question)
+            if local_response is not None:
+                self.sock.sendto(local_response, client_address)
+                print("LOCAL RESPONSE SENT TO {}".format(client_address))
+                continue
             message = Message.parse(question)
             answers = []
             query = message.questions[0]
@@ -82,14 +113,14 @@ class DNSServer:
     def _get_destination_server_names(self, name: str) -> list:
         zone = self._find_domain_name(name, [key for key, value in self.ns_records_cache.items() if len(value) != 0])
         return [ns_time_pair[0] for ns_time_pair in self.ns_records_cache[zone]
-                if ns_time_pair[1] > time.time() or ns_time_pair[1] == -1]
+                if ns_time_pair[1] > self.clock() or ns_time_pair[1] == -1]
 
     def _resolve(self, query) -> (RCode, list):
         print('-' * 40)
         print("Resolve {}".format(query.qname))
         search_results = self._cache_search(query)
         if search_results:
-            records = [Message.create_rr(query, *result) for result in search_results]
+            records = [Message.create_rr(query, *result, clock=self.clock) for result in search_results]
             print('Found in cache')
             for record in records:
                 print(record)
@@ -110,15 +141,19 @@ class DNSServer:
                     if intermediate_r_code != RCode.NO_ERROR:
                         continue
                 ip_addresses = [ip_time_pairs[0] for ip_time_pairs in self.a_records_cache[server]
-                                if ip_time_pairs[1] > time.time() or ip_time_pairs[1] == -1]
+                                if ip_time_pairs[1] > self.clock() or ip_time_pairs[1] == -1]
                 for ip_address in ip_addresses:
                     self.sock.sendto(bytes_query, (ip_address, 53))
+                    if self.capture is not None:
+                        self.capture.write_upstream_query(bytes_query, (ip_address, 53))
                     print('Query to {} ({})'.format(server, ip_address))
                     answer_received = False
                     self.sock.settimeout(3)
                     try:
                         while not answer_received:
                             raw_response, address = self.sock.recvfrom(512)
+                            if self.capture is not None:
+                                self.capture.write_response(raw_response, address)
                             response = Message.parse(raw_response)
                             if response.header.id == query_message.header.id:
                                 answer_received = True
@@ -148,11 +183,11 @@ class DNSServer:
         if query.qtype == Type.NS:
             if query.qname in self.ns_records_cache:
                 return [ns_time_pair for ns_time_pair in self.ns_records_cache[query.qname]
-                        if ns_time_pair[1] > time.time() or ns_time_pair[1] == -1]
+                        if ns_time_pair[1] > self.clock() or ns_time_pair[1] == -1]
         elif query.qtype == Type.A:
             if query.qname in self.a_records_cache:
                 return [ip_time_pair for ip_time_pair in self.a_records_cache[query.qname]
-                        if ip_time_pair[1] > time.time() or ip_time_pair[1] == -1]
+                        if ip_time_pair[1] > self.clock() or ip_time_pair[1] == -1]
         # else:
         #     raise NotImplementedError('Type {} is not implemented'.format(query.qtype))
         return None
@@ -173,7 +208,7 @@ class DNSServer:
         for rr in response.answer_rrs + response.authority_rrs + response.additional_rrs:
             if rr.rclass != Class.IN:
                 raise NotImplementedError('Class {} isn\'t implemented'.format(rr.rclass))
-            expiry_time = int(time.time()) + rr.ttl
+            expiry_time = int(self.clock()) + rr.ttl
             if rr.rtype == Type.A:
                 if rr.name in self.a_records_cache:
                     is_new_rr = True
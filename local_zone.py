@@ -0,0 +1,272 @@
+import os.path
+import time
+import ipaddress
+from typing import Callable, List, Optional, Sequence, Set, Tuple
+
+from message.message_format import Message
+from message.header import Header
+from message.question import Question
+from message.resource_record import ResourceRecord as RR
+from message.flags import RCode, Type, Class
+
+
+class LocalZone:
+    """Answers for local zone files and hosts-style files, compiled into ready-made wire responses.
+
+    Files ending with ZONE_FILE_EXTENSION are read as master files, the rest as hosts files.
+    The table is keyed by the lowercased question section and holds the header and the record
+    sections, so a hit only joins them with the query id and the question exactly as the client sent it.
+    CNAME owners answer every type with the CNAME chain and the local records of its target.
+    Other local names, including empty non-terminals, get NODATA for types they don't own, and names
+    inside a loaded zone that don't exist get NXDOMAIN; both carry the zone SOA in the authority section.
+    Names owning record types that aren't served get REFUSED instead, as they can't be answered authoritatively.
+    """
+    ZONE_FILE_EXTENSION = '.zone'
+    DEFAULT_TTL = 60 * 60
+    RELOAD_INTERVAL = 1
+    SUPPORTED_TYPES = (Type.A, Type.NS, Type.CNAME, Type.MX, Type.AAAA)
+    MAX_CNAME_CHAIN = 8
+    IN_CLASS = Class.IN.value.to_bytes(2, 'big')
+
+    def __init__(self, file_names: Sequence[str] = (), clock: Callable[[], float] = time.time):
+        self.file_names = list(file_names)
+        self.clock = clock
+        self.answers = {}
+        self.names = {}
+        self.zones = {}
+        self._mtimes = {}
+        self._last_check = 0
+
+    def load(self) -> None:
+        mtimes = self._get_mtimes()
+        self.answers, self.names, self.zones = self._compile()
+        self._mtimes = mtimes
+        self._last_check = self.clock()
+
+    def reload_if_changed(self) -> bool:
+        current_time = self.clock()
+        if current_time - self._last_check < self.RELOAD_INTERVAL:
+            return False
+        self._last_check = current_time
+        mtimes = self._get_mtimes()
+        if mtimes == self._mtimes:
+            return False
+        self._mtimes = mtimes
+        try:
+            compiled = self._compile()
+        except (OSError, ValueError) as e:
+            print('Local files are not reloaded: {}'.format(e))
+            return False
+        self.answers, self.names, self.zones = compiled
+        print('RELOAD LOCAL FILES')
+        return True
+
+    def lookup(self, query: bytes) -> Optional[bytes]:
+        if len(query) < 12 or query[2] & 0xf8 or query[4:6] != b'\x00\x01':
+            return None
+        question_end = Message._find_question_end(query)
+        if question_end is None:
+            return None
+        name = query[12:question_end - 4].lower()
+        response = self.answers.get(name + query[question_end - 4:question_end])
+        if response is None:
+            if query[question_end - 2:question_end] != self.IN_CLASS:
+                return None
+            response = self.names.get(name)
+        if response is None and self.zones:
+            position = 0
+            while response is None and name[position] != 0:
+                response = self.zones.get(name[position:])
+                position += name[position] + 1
+        if response is None:
+            return None
+        header, sections = response
+        return query[:2] + header + query[12:question_end] + sections
+
+    def _get_mtimes(self) -> dict:
+        return {file_name: os.path.getmtime(file_name) if os.path.exists(file_name) else None
+                for file_name in self.file_names}
+
+    def _compile(self) -> Tuple[dict, dict, dict]:
+        records = {}
+        names = set()
+        unserved_names = set()
+        soa_records = {}
+        for file_name in self.file_names:
+            if file_name.endswith(self.ZONE_FILE_EXTENSION):
+                zone, rrs, owners, unserved, soa = self._parse_zone_file(file_name)
+                soa_records[zone] = soa
+                names.update(owners)
+                unserved_names.update(unserved)
+            else:
+                rrs = self._parse_hosts_file(file_name)
+            for rr in rrs:
+                records.setdefault((rr.name, rr.rtype), []).append(rr)
+                names.add(rr.name)
+
+        answers = {}
+        for (name, rtype), rrs in records.items():
+            answers[Question(name, rtype).to_bytes(Message._name_to_bytes)] = self._answer(rrs)
+        cnames = {name: rrs[0] for (name, rtype), rrs in records.items() if rtype == Type.CNAME}
+        for name, cname in cnames.items():
+            for rtype in self.SUPPORTED_TYPES:
+                if rtype != Type.CNAME:
+                    answers[Question(name, rtype).to_bytes(Message._name_to_bytes)] = \
+                        self._answer(self._follow_cname(cname, rtype, records, cnames))
+
+        negative_names = {}
+        for name in names:
+            if name in cnames:
+                response = self._answer(self._follow_cname(cnames[name], None, records, cnames))
+            elif name in unserved_names:
+                response = Header(b'', qr=True, rd=True, ra=True, rcode=RCode.REFUSED, qdcount=1).to_bytes(), b''
+            else:
+                response = self._negative_response(RCode.NO_ERROR,
+                                                   soa_records.get(self._find_zone(name, soa_records)))
+            negative_names[Message._name_to_bytes(name)] = response
+        zones = {Message._name_to_bytes(zone): self._negative_response(RCode.NAME_ERROR, soa)
+                 for zone, soa in soa_records.items()}
+        return answers, negative_names, zones
+
+    @staticmethod
+    def _answer(rrs: List[RR]) -> Tuple[bytes, bytes]:
+        header = Header(b'', qr=True, aa=True, rd=True, ra=True, qdcount=1, ancount=len(rrs))
+        return header.to_bytes(), b''.join([rr.to_bytes(Message._name_to_bytes) for rr in rrs])
+
+    @staticmethod
+    def _follow_cname(cname: RR, rtype: Optional[Type], records: dict, cnames: dict) -> List[RR]:
+        chain = [cname]
+        while cname.rdata in cnames and len(chain) < LocalZone.MAX_CNAME_CHAIN:
+            cname = cnames[cname.rdata]
+            if cname in chain:
+                break
+            chain.append(cname)
+        return chain + records.get((cname.rdata, rtype), [])
+
+    @staticmethod
+    def _negative_response(r_code: RCode, soa: Optional[RR]) -> Tuple[bytes, bytes]:
+        authority_rrs = [soa] if soa is not None else []
+        header = Header(b'', qr=True, aa=True, rd=True, ra=True, rcode=r_code, qdcount=1, nscount=len(authority_rrs))
+        return header.to_bytes(), b''.join([rr.to_bytes(Message._name_to_bytes) for rr in authority_rrs])
+
+    @staticmethod
+    def _find_zone(name: str, zones: dict) -> Optional[str]:
+        while True:
+            if name in zones:
+                return name
+            if '.' not in name:
+                return None
+            name = name.split('.', 1)[1]
+
+    @staticmethod
+    def _parse_hosts_file(file_name: str) -> List[RR]:
+        rrs = []
+        with open(file_name, 'r', encoding='utf-8') as file:
+            for line in file:
+                fields = line.split('#', 1)[0].split()
+                if len(fields) < 2:
+                    continue
+                address = ipaddress.ip_address(fields[0])
+                rtype = Type.A if address.version == 4 else Type.AAAA
+                for name in fields[1:]:
+                    rrs.append(RR.create(name.rstrip('.').lower(),
+                                         ttl=LocalZone.DEFAULT_TTL, rdata=str(address), rtype=rtype))
+        return rrs
+
+    @staticmethod
+    def _parse_zone_file(file_name: str) -> Tuple[str, List[RR], Set[str], Set[str], Optional[RR]]:
+        origin = os.path.basename(file_name)[:-len(LocalZone.ZONE_FILE_EXTENSION)].lower()
+        zone = None
+        default_ttl = LocalZone.DEFAULT_TTL
+        last_name = origin
+        rrs = []
+        owners = set()
+        unserved = set()
+        soa = None
+        for line_number, line in LocalZone._read_zone_entries(file_name):
+            fields = line.split()
+            if not fields:
+                raise ValueError('{}:{}: malformed entry'.format(file_name, line_number))
+            if fields[0].upper() in ('$ORIGIN', '$TTL') and len(fields) < 2:
+                raise ValueError('{}:{}: malformed {} directive'.format(file_name, line_number, fields[0]))
+            if fields[0].upper() == '$ORIGIN':
+                origin = LocalZone._absolute_name(fields[1], origin)
+                continue
+            if fields[0].upper() == '$TTL':
+                default_ttl = int(fields[1])
+                continue
+            if zone is None:
+                zone = origin
+            if line[0].isspace():
+                name = last_name
+            else:
+                name = LocalZone._absolute_name(fields.pop(0), origin)
+                last_name = name
+            ttl = default_ttl
+            while fields and (fields[0].isdigit() or fields[0].upper() in Class.__members__):
+                token = fields.pop(0)
+                if token.isdigit():
+                    ttl = int(token)
+                elif token.upper() != Class.IN.name:
+                    raise ValueError('{}:{}: class {} is not implemented'.format(file_name, line_number, token))
+            if len(fields) < 2:
+                raise ValueError('{}:{}: malformed record'.format(file_name, line_number))
+            owners.add(name)
+            if fields[0].upper() == Type.SOA.name:
+                if len(fields) < 8:
+                    raise ValueError('{}:{}: malformed SOA record'.format(file_name, line_number))
+                minimum = int(fields[7])
+                rdata = ' '.join([LocalZone._absolute_name(fields[1], origin),
+                                  LocalZone._absolute_name(fields[2], origin),
+                                  *[str(int(number)) for number in fields[3:8]]])
+                # negative answers are cached for the lesser of the SOA TTL and its minimum field
+                soa = RR.create(name, ttl=min(ttl, minimum), rdata=rdata, rtype=Type.SOA)
+                continue
+            if fields[0].upper() not in Type.__members__ or Type[fields[0].upper()] not in LocalZone.SUPPORTED_TYPES:
+                unserved.add(name)
+                continue
+            rtype = Type[fields[0].upper()]
+            if rtype in (Type.NS, Type.CNAME):
+                rdata = LocalZone._absolute_name(fields[1], origin)
+            elif rtype == Type.MX:
+                if len(fields) < 3:
+                    raise ValueError('{}:{}: malformed MX record'.format(file_name, line_number))
+                rdata = '{} {}'.format(int(fields[1]), LocalZone._absolute_name(fields[2], origin))
+            elif rtype == Type.A:
+                rdata = str(ipaddress.IPv4Address(fields[1]))
+            else:
+                rdata = str(ipaddress.IPv6Address(fields[1]))
+            rrs.append(RR.create(name, ttl=ttl, rdata=rdata, rtype=rtype))
+        zone = zone if zone is not None else origin
+        for owner in list(owners):
+            while owner.endswith('.' + zone):
+                owner = owner.split('.', 1)[1]
+                owners.add(owner)
+        return zone, rrs, owners, unserved, soa
+
+    @staticmethod
+    def _read_zone_entries(file_name: str):
+        entry = ''
+        entry_line_number = 0
+        with open(file_name, 'r', encoding='utf-8') as file:
+            for line_number, line in enumerate(file, 1):
+                line = line.split(';', 1)[0].rstrip()
+                if not entry:
+                    if not line.strip():
+                        continue
+                    entry_line_number = line_number
+                entry += line + ' '
+                if entry.count('(') > entry.count(')'):
+                    continue
+                yield entry_line_number, entry.replace('(', ' ').replace(')', ' ')
+                entry = ''
+        if entry:
+            raise ValueError('{}:{}: unbalanced parentheses'.format(file_name, entry_line_number))
+
+    @staticmethod
+    def _absolute_name(name: str, origin: str) -> str:
+        if name == '@':
+            return origin
+        if name.endswith('.'):
+            return name[:-1].lower()
+        return (name + ('.' + origin if origin else '')).lower()
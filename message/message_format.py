@@ -1,4 +1,4 @@
-from typing import Tuple, List
+from typing import Callable, Optional, Tuple, List
 from io import BytesIO
 from random import randrange
 import time
@@ -62,6 +62,21 @@ class Message:
 
         return Message(header, questions, answer_rrs, authority_rrs, additional_rrs)
 
+    @staticmethod
+    def _find_question_end(data: bytes) -> Optional[int]:
+        end = 12
+        while True:
+            if end >= len(data):
+                return None
+            label_length = data[end]
+            if label_length == 0:
+                break
+            if label_length & 0xc0:
+                return None
+            end += label_length + 1
+        question_end = end + 5
+        return question_end if question_end <= len(data) else None
+
     @staticmethod
     def _parse_name(raw_data: bytes, start: int) -> Tuple[str, int]:
         name_length = 0
@@ -105,8 +120,8 @@ class Message:
         return result + (0).to_bytes(1, 'big')
 
     @staticmethod
-    def create_rr(query: Question, data: str, expiry_time: int):
-        ttl = (expiry_time - int(time.time())) if expiry_time != -1 else 60*60*24
+    def create_rr(query: Question, data: str, expiry_time: int, clock: Callable[[], float] = time.time):
+        ttl = (expiry_time - int(clock())) if expiry_time != -1 else 60*60*24
         return RR.create(query.qname, ttl=ttl, rdata=data, rtype=query.qtype)
 
     @staticmethod
@@ -1,5 +1,6 @@
 from typing import Callable, Tuple
 from io import BytesIO
+import ipaddress
 
 from message.flags import Type, Class
 
@@ -62,17 +63,29 @@ class ResourceRecord:
         if rr_type == Type.A:
             ip_address = data[start: start + length]
             return '.'.join([str(byte) for byte in ip_address])
-        elif rr_type == Type.NS:
+        elif rr_type in (Type.NS, Type.CNAME):
             name, name_length = name_parser(data, start)
             if length != name_length:
                 raise ValueError('Something went wrong')
             return name
+        elif rr_type == Type.MX:
+            preference = int.from_bytes(data[start: start + 2], 'big')
+            exchange, exchange_length = name_parser(data, start + 2)
+            if length != exchange_length + 2:
+                raise ValueError('Something went wrong')
+            return '{} {}'.format(preference, exchange)
         elif rr_type == Type.AAAA:
             parts = []
             with BytesIO(data[start: start + length]) as ip_address:
                 for i in range(length // 2):
                     parts.append(ip_address.read(2).hex())
             return ':'.join(parts)
+        elif rr_type == Type.SOA:
+            mname, mname_length = name_parser(data, start)
+            rname, rname_length = name_parser(data, start + mname_length)
+            numbers_start = start + mname_length + rname_length
+            numbers = [int.from_bytes(data[numbers_start + i: numbers_start + i + 4], 'big') for i in range(0, 20, 4)]
+            return ' '.join([mname, rname, *[str(number) for number in numbers]])
         else:
             raise NotImplementedError('Parsing data of type {} is not implemented'.format(rr_type.name))
 
@@ -95,8 +108,17 @@ class ResourceRecord:
             for part in parts:
                 result += int(part).to_bytes(1, 'big')
             return result
-        if self.rtype == Type.NS:
+        if self.rtype in (Type.NS, Type.CNAME):
             return name_to_bytes(self.rdata)
+        if self.rtype == Type.MX:
+            preference, exchange = self.rdata.split()
+            return int(preference).to_bytes(2, 'big') + name_to_bytes(exchange)
+        if self.rtype == Type.AAAA:
+            return ipaddress.IPv6Address(self.rdata).packed
+        if self.rtype == Type.SOA:
+            mname, rname, *numbers = self.rdata.split()
+            return name_to_bytes(mname) + name_to_bytes(rname) + \
+                   b''.join([int(number).to_bytes(4, 'big') for number in numbers])
         raise NotImplementedError()
 
     def __str__(self):
@@ -0,0 +1,200 @@
+from argparse import ArgumentParser
+from collections import deque
+from socket import timeout
+from typing import List, Optional, Sequence, Tuple
+import os.path
+import tempfile
+import time
+import json
+
+from capture import Capture, RecordKind
+from message.message_format import Message
+from dns_server import DNSServer
+
+
+class ReplayFinished(Exception):
+    pass
+
+
+class ReplaySocket:
+    """Stands in for the server socket: hands out captured client queries and answers
+    upstream queries with the captured exchanges of the same server for the same question.
+    An exchange is the captured round-trip time and the response, or None if the server timed out;
+    the round-trip time is waited out scaled by speed.
+
+    It also keeps the replay clock: captured time of the first query plus the elapsed time
+    scaled by speed, or the captured time of the current query when replaying without delays.
+    """
+
+    def __init__(self, queries: List[Tuple[float, bytes, Tuple[str, int]]], responses: dict, speed: float):
+        self.queries = deque(queries)
+        self.responses = responses
+        self.speed = speed
+        self.pending = deque()
+        self.client_address = None
+        self.received_at = 0
+        self.query_timestamp = queries[0][0] if queries else 0
+        self.latencies = []
+        self.upstream_misses = 0
+        self.upstream_timeouts = 0
+        self._first_timestamp = queries[0][0] if queries else 0
+        self._start = None
+
+    def recvfrom(self, size: int) -> Tuple[bytes, Tuple[str, int]]:
+        if self.client_address is not None:
+            if not self.pending:
+                raise timeout()
+            delay, response = self.pending.popleft()
+            if self.speed > 0:
+                time.sleep(delay / self.speed)
+            if response is None:
+                raise timeout()
+            return response
+        if not self.queries:
+            raise ReplayFinished()
+        timestamp, data, address = self.queries.popleft()
+        if self._start is None:
+            self._start = time.perf_counter()
+        if self.speed > 0:
+            delay = self._start + (timestamp - self._first_timestamp) / self.speed - time.perf_counter()
+            if delay > 0:
+                time.sleep(delay)
+        self.query_timestamp = timestamp
+        self.client_address = address
+        self.pending.clear()
+        self.received_at = time.perf_counter()
+        return data[:size], address
+
+    def sendto(self, data: bytes, address: Tuple[str, int]) -> int:
+        if address == self.client_address:
+            self.latencies.append(time.perf_counter() - self.received_at)
+            self.client_address = None
+            self.pending.clear()
+            return len(data)
+        exchanges = self.responses.get((address, question_key(data)))
+        if not exchanges:
+            self.upstream_misses += 1
+            return len(data)
+        # the last captured exchange keeps serving repeated questions of a colder cache
+        delay, response = exchanges.popleft() if len(exchanges) > 1 else exchanges[0]
+        if response is None:
+            self.upstream_timeouts += 1
+            self.pending.append((delay, None))
+        else:
+            self.pending.append((delay, (data[:2] + response[2:], address)))
+        return len(data)
+
+    def clock(self) -> float:
+        if self.speed <= 0 or self._start is None:
+            return self.query_timestamp
+        return self._first_timestamp + (time.perf_counter() - self._start) * self.speed
+
+    def settimeout(self, value: Optional[float]) -> None:
+        pass
+
+    def close(self) -> None:
+        pass
+
+
+class Replay:
+    """Feeds a capture back into DNSServer at the original timing divided by speed (0 means no delays).
+
+    The server runs on the replay clock, so cached records expire at the same point of the traffic
+    as they did in the capture whatever the speed.
+    """
+
+    def __init__(self, capture_file: str, speed: float = 1.0, local_files: Sequence[str] = ()):
+        self.capture_file = capture_file
+        self.speed = speed
+        self.local_files = local_files
+        self.failures = 0
+        self.elapsed = 0
+        self.sock = None
+        self.server = None
+
+    def run(self) -> None:
+        snapshot = None
+        queries = []
+        responses = {}
+        # the server waits for one upstream answer at a time, so a query still outstanding
+        # when the next query is sent has timed out
+        outstanding = None
+        for kind, timestamp, data, address in Capture.read(self.capture_file):
+            key = question_key(data) if kind in (RecordKind.UPSTREAM_QUERY, RecordKind.RESPONSE) else None
+            if kind == RecordKind.RESPONSE:
+                if outstanding is not None and outstanding[:2] == (address, key):
+                    responses.setdefault((address, key), deque()).append((timestamp - outstanding[2], data))
+                    outstanding = None
+                continue
+            if outstanding is not None and kind != RecordKind.SNAPSHOT:
+                responses.setdefault(outstanding[:2], deque()).append((timestamp - outstanding[2], None))
+                outstanding = None
+            if kind == RecordKind.SNAPSHOT:
+                snapshot = json.loads(data.decode('utf-8'))
+            elif kind == RecordKind.QUERY:
+                queries.append((timestamp, data, address))
+            elif key is not None:
+                outstanding = address, key, timestamp
+        if outstanding is not None:
+            responses.setdefault(outstanding[:2], deque()).append((0, None))
+
+        self.sock = ReplaySocket(queries, responses, self.speed)
+        self.server = DNSServer(local_files=self.local_files, sock=self.sock, clock=self.sock.clock)
+        self._run(self.server, snapshot)
+
+    def _run(self, server: DNSServer, snapshot: Optional[list]) -> None:
+        with tempfile.TemporaryDirectory() as directory:
+            server.A_RECORDS_CACHE_FILE_NAME = os.path.join(directory, DNSServer.A_RECORDS_CACHE_FILE_NAME)
+            server.NS_RECORDS_CACHE_FILE_NAME = os.path.join(directory, DNSServer.NS_RECORDS_CACHE_FILE_NAME)
+            if snapshot is not None:
+                server.a_records_cache, server.ns_records_cache = snapshot
+                server._remove_expired_records()
+            else:
+                server._load_cache()
+            server.local_zone.load()
+            start = time.perf_counter()
+            while True:
+                try:
+                    server._run()
+                except ReplayFinished:
+                    break
+                except Exception as e:
+                    print('Query failed: {!r}'.format(e))
+                    self.failures += 1
+                    self.sock.client_address = None
+                    self.sock.pending.clear()
+            self.elapsed = time.perf_counter() - start
+
+    def print_report(self) -> None:
+        latencies = sorted(self.sock.latencies)
+        print('=' * 50)
+        print('Queries answered: {}'.format(len(latencies)))
+        print('Queries failed: {}'.format(self.failures))
+        print('Upstream queries missing from the capture: {}'.format(self.sock.upstream_misses))
+        print('Upstream queries timed out in the capture: {}'.format(self.sock.upstream_timeouts))
+        print('Elapsed: {:.3f} s'.format(self.elapsed))
+        if latencies:
+            print('Throughput: {:.1f} queries/s'.format(len(latencies) / self.elapsed))
+            print('Latency mean/median/max: {:.3f}/{:.3f}/{:.3f} ms'.format(
+                1000 * sum(latencies) / len(latencies),
+                1000 * latencies[len(latencies) // 2],
+                1000 * latencies[-1]))
+
+
+def question_key(data: bytes) -> Optional[bytes]:
+    question_end = Message._find_question_end(data)
+    if question_end is None:
+        return None
+    return data[12:question_end - 4].lower() + data[question_end - 4:question_end]
+
+
+if __name__ == '__main__':
+    parser = ArgumentParser(description='Replay a capture written by DNSServer(capture_file=...)')
+    parser.add_argument('capture_file')
+    parser.add_argument('--speed', type=float, default=1.0,
+                        help='timing speed-up factor, 0 replays without delays')
+    parser.add_argument('--local', nargs='*', default=[], help='local zone and hosts files')
+    arguments = parser.parse_args()
+    replay = Replay(arguments.capture_file, arguments.speed, arguments.local)
+    replay.run()
+    replay.print_report()
@@ -1,9 +1,15 @@
 import unittest
+import os.path
+import tempfile
+from unittest import mock
 
 from message.message_format import Message
 from message.flags import *
 from message.header import Header
 from message.question import Question
+from local_zone import LocalZone
+from capture import Capture, RecordKind
+from replay import Replay
 
 
 class TestParsing(unittest.TestCase):
@@ -77,5 +83,226 @@ class TestPackingInBytes(unittest.TestCase):
         self.assertSequenceEqual(expected, actual)
 
 
+class TestLocalZone(unittest.TestCase):
+    ZONE = '$TTL 300\n' \
+           '@ IN SOA ns1 admin ( 1 3600 600\n' \
+           '                     86400 300 )\n' \
+           '@ IN NS ns1 ; name server\n' \
+           'ns1 IN A 10.0.0.1\n' \
+           'www 60 IN A 10.0.0.2\n' \
+           '    IN A 10.0.0.3\n' \
+           'alias IN CNAME ns1\n' \
+           'mail IN MX 10 ns1\n' \
+           'a.b IN A 10.0.0.9\n' \
+           'info IN TXT hello\n'
+    HOSTS = '# comment\n' \
+            '192.168.1.5 printer.lan printer\n' \
+            '::1 localhost\n'
+
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.zone_file = os.path.join(self.directory.name, 'corp.example.zone')
+        self.hosts_file = os.path.join(self.directory.name, 'hosts')
+        with open(self.zone_file, 'w', encoding='utf-8') as file:
+            file.write(self.ZONE)
+        with open(self.hosts_file, 'w', encoding='utf-8') as file:
+            file.write(self.HOSTS)
+        self.local_zone = LocalZone([self.zone_file, self.hosts_file])
+        self.local_zone.load()
+
+    def tearDown(self):
+        self.directory.cleanup()
+
+    def test_zone_answer(self):
+        query = Message.create_query('WWW.corp.example', Type.A, id=b'\x12\x34').to_bytes()
+        response = Message.parse(self.local_zone.lookup(query))
+        self.assertEqual(response.header.id, b'\x12\x34')
+        self.assertEqual(response.header.r_code, RCode.NO_ERROR)
+        self.assertEqual(sorted(rr.rdata for rr in response.answer_rrs), ['10.0.0.2', '10.0.0.3'])
+        self.assertEqual(response.answer_rrs[0].ttl, 60)
+        self.assertTrue(response.header.aa)
+
+    def test_question_case_is_kept(self):
+        query = Message.create_query('NS1.Corp.Example', Type.A, id=b'\x00\x01').to_bytes()
+        response = self.local_zone.lookup(query)
+        self.assertEqual(response[12:len(query)], query[12:])
+        self.assertEqual(Message.parse(response).answer_rrs[0].rdata, '10.0.0.1')
+        query = Message.create_query('WWW.Corp.Example', Type.AAAA, id=b'\x00\x01').to_bytes()
+        self.assertEqual(self.local_zone.lookup(query)[12:len(query)], query[12:])
+
+    def test_zone_ns_answer(self):
+        query = Message.create_query('corp.example', Type.NS, id=b'\x00\x01').to_bytes()
+        response = Message.parse(self.local_zone.lookup(query))
+        self.assertEqual([rr.rdata for rr in response.answer_rrs], ['ns1.corp.example'])
+        self.assertEqual(response.answer_rrs[0].ttl, 300)
+
+    def test_hosts_answer(self):
+        query = Message.create_query('printer', Type.A, id=b'\x00\x01').to_bytes()
+        response = Message.parse(self.local_zone.lookup(query))
+        self.assertEqual([rr.rdata for rr in response.answer_rrs], ['192.168.1.5'])
+        query = Message.create_query('localhost', Type.AAAA, id=b'\x00\x01').to_bytes()
+        response = Message.parse(self.local_zone.lookup(query))
+        self.assertEqual(response.answer_rrs[0].rdata, '0000:0000:0000:0000:0000:0000:0000:0001')
+
+    def test_missing_names(self):
+        query = Message.create_query('www.corp.example', Type.AAAA, id=b'\x00\x01').to_bytes()
+        response = Message.parse(self.local_zone.lookup(query))
+        self.assertEqual(response.header.r_code, RCode.NO_ERROR)
+        self.assertEqual(response.answer_rrs, [])
+        query = Message.create_query('ftp.corp.example', Type.A, id=b'\x00\x01').to_bytes()
+        response = Message.parse(self.local_zone.lookup(query))
+        self.assertEqual(response.header.r_code, RCode.NAME_ERROR)
+        self.assertTrue(response.header.aa)
+        self.assertEqual([(rr.name, rr.rtype, rr.ttl) for rr in response.authority_rrs],
+                         [('corp.example', Type.SOA, 300)])
+        self.assertEqual(response.authority_rrs[0].rdata, 'ns1.corp.example admin.corp.example 1 3600 600 86400 300')
+        query = Message.create_query('yandex.ru', Type.A, id=b'\x00\x01').to_bytes()
+        self.assertIsNone(self.local_zone.lookup(query))
+
+    def test_existing_names_get_no_data(self):
+        for name in ['mail.corp.example', 'b.corp.example']:
+            query = Message.create_query(name, Type.A, id=b'\x00\x01').to_bytes()
+            response = Message.parse(self.local_zone.lookup(query))
+            self.assertEqual(response.header.r_code, RCode.NO_ERROR)
+            self.assertEqual(response.answer_rrs, [])
+            self.assertEqual([rr.rtype for rr in response.authority_rrs], [Type.SOA])
+
+    def test_cname_and_mx_answers(self):
+        query = Message.create_query('alias.corp.example', Type.A, id=b'\x00\x01').to_bytes()
+        response = Message.parse(self.local_zone.lookup(query))
+        self.assertEqual([(rr.name, rr.rtype, rr.rdata) for rr in response.answer_rrs],
+                         [('alias.corp.example', Type.CNAME, 'ns1.corp.example'),
+                          ('ns1.corp.example', Type.A, '10.0.0.1')])
+        query = Message.create_query('alias.corp.example', Type.AAAA, id=b'\x00\x01').to_bytes()
+        response = Message.parse(self.local_zone.lookup(query))
+        self.assertEqual([rr.rtype for rr in response.answer_rrs], [Type.CNAME])
+        query = Message.create_query('mail.corp.example', Type.MX, id=b'\x00\x01').to_bytes()
+        response = Message.parse(self.local_zone.lookup(query))
+        self.assertTrue(response.header.aa)
+        self.assertEqual([rr.rdata for rr in response.answer_rrs], ['10 ns1.corp.example'])
+
+    def test_unserved_types_are_refused(self):
+        query = Message.create_query('info.corp.example', Type.A, id=b'\x00\x01').to_bytes()
+        response = Message.parse(self.local_zone.lookup(query))
+        self.assertEqual(response.header.r_code, RCode.REFUSED)
+        self.assertFalse(response.header.aa)
+        self.assertEqual(response.authority_rrs, [])
+
+    def test_hosts_names_without_zones(self):
+        local_zone = LocalZone([self.hosts_file])
+        local_zone.load()
+        query = Message.create_query('printer', Type.AAAA, id=b'\x00\x01').to_bytes()
+        response = Message.parse(local_zone.lookup(query))
+        self.assertEqual(response.header.r_code, RCode.NO_ERROR)
+        self.assertEqual(response.answer_rrs, [])
+        self.assertEqual(response.authority_rrs, [])
+
+    def test_reload(self):
+        with open(self.hosts_file, 'w', encoding='utf-8') as file:
+            file.write('192.168.1.6 printer\n')
+        os.utime(self.hosts_file, (0, 0))
+        self.local_zone._last_check = 0
+        self.assertTrue(self.local_zone.reload_if_changed())
+        query = Message.create_query('printer', Type.A, id=b'\x00\x01').to_bytes()
+        response = Message.parse(self.local_zone.lookup(query))
+        self.assertEqual([rr.rdata for rr in response.answer_rrs], ['192.168.1.6'])
+
+    def test_failed_reload_keeps_answers(self):
+        with open(self.hosts_file, 'w', encoding='utf-8') as file:
+            file.write('not-an-address printer\n')
+        os.utime(self.hosts_file, (0, 0))
+        self.local_zone._last_check = 0
+        self.assertFalse(self.local_zone.reload_if_changed())
+        query = Message.create_query('printer', Type.A, id=b'\x00\x01').to_bytes()
+        self.assertIsNotNone(self.local_zone.lookup(query))
+
+    def test_malformed_zone_reload_keeps_answers(self):
+        for content in ['$ORIGIN\n', '$TTL\n', '( )\n', 'www IN MX 10\n']:
+            with open(self.zone_file, 'w', encoding='utf-8') as file:
+                file.write(content)
+            os.utime(self.zone_file, (0, 0))
+            self.local_zone._mtimes = {}
+            self.local_zone._last_check = 0
+            self.assertFalse(self.local_zone.reload_if_changed())
+            query = Message.create_query('www.corp.example', Type.A, id=b'\x00\x01').to_bytes()
+            self.assertIsNotNone(self.local_zone.lookup(query))
+
+
+class TestCaptureReplay(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.capture_file = os.path.join(self.directory.name, 'capture.bin')
+
+    def tearDown(self):
+        self.directory.cleanup()
+
+    ROOT = ('199.7.83.42', 53)
+    OTHER_ROOT = ('202.12.27.33', 53)
+
+    def _write_capture(self, query: Message, a_records_cache: dict = None, exchanges=None):
+        if exchanges is None:
+            exchanges = [(self.ROOT, TestParsing.DATA, 1100.25)]
+        capture = Capture(self.capture_file)
+        with mock.patch('capture.time.time', return_value=1000):
+            capture.write_snapshot(a_records_cache or {'l.root-servers.net': [['199.7.83.42', -1]],
+                                                       'm.root-servers.net': [['202.12.27.33', -1]]},
+                                   {'': [['l.root-servers.net', -1], ['m.root-servers.net', -1]]})
+        sent_at = 1100
+        with mock.patch('capture.time.time', return_value=sent_at):
+            capture.write_query(query.to_bytes(), ('127.0.0.1', 5353))
+        upstream_query = Message.create_query(query.questions[0].qname, Type.A).to_bytes()
+        for address, response, received_at in exchanges:
+            with mock.patch('capture.time.time', return_value=sent_at):
+                capture.write_upstream_query(upstream_query, address)
+            if response is not None:
+                with mock.patch('capture.time.time', return_value=received_at):
+                    capture.write_response(response, address)
+            sent_at = received_at
+        capture.close()
+
+    def test_read_capture(self):
+        query = Message.create_query('yandex.ru', Type.A, id=b'\xe7\x26')
+        self._write_capture(query)
+        records = list(Capture.read(self.capture_file))
+        self.assertEqual([record[0] for record in records],
+                         [RecordKind.SNAPSHOT, RecordKind.QUERY, RecordKind.UPSTREAM_QUERY, RecordKind.RESPONSE])
+        self.assertEqual(records[1][2:], (query.to_bytes(), ('127.0.0.1', 5353)))
+        self.assertEqual(records[3][1:], (1100.25, TestParsing.DATA, self.ROOT))
+
+    def test_replay(self):
+        self._write_capture(Message.create_query('yandex.ru', Type.A, id=b'\x00\x07'))
+        replay = Replay(self.capture_file, speed=0)
+        replay.run()
+        self.assertEqual(len(replay.sock.latencies), 1)
+        self.assertEqual(replay.failures, 0)
+        self.assertEqual(replay.sock.upstream_misses, 0)
+        self.assertEqual(replay.sock.upstream_timeouts, 0)
+
+    def test_replay_matches_responding_server(self):
+        query = Message.create_query('yandex.ru', Type.A, id=b'\x00\x07')
+        other_response = Message.create_response(b'\x00\x07', RCode.NAME_ERROR, query.questions, []).to_bytes()
+        self._write_capture(query, exchanges=[(self.OTHER_ROOT, other_response, 1100.1),
+                                              (self.ROOT, TestParsing.DATA, 1100.2)])
+        replay = Replay(self.capture_file, speed=0)
+        replay.run()
+        self.assertIn('yandex.ru', replay.server.a_records_cache)
+
+    def test_replay_timeout(self):
+        self._write_capture(Message.create_query('yandex.ru', Type.A, id=b'\x00\x07'),
+                            exchanges=[(self.ROOT, None, 1103), (self.OTHER_ROOT, TestParsing.DATA, 1103.05)])
+        replay = Replay(self.capture_file, speed=100)
+        replay.run()
+        self.assertEqual(replay.sock.upstream_timeouts, 1)
+        self.assertEqual(replay.sock.upstream_misses, 0)
+        self.assertGreaterEqual(replay.sock.latencies[0], 3.05 / 100)
+        self.assertIn('yandex.ru', replay.server.a_records_cache)
+
+    def test_replay_clock(self):
+        a_records_cache = {'l.root-servers.net': [['199.7.83.42', -1]], 'yandex.ru': [['192.0.2.2', 1050]]}
+        self._write_capture(Message.create_query('yandex.ru', Type.A, id=b'\x00\x07'), a_records_cache)
+        replay = Replay(self.capture_file, speed=0)
+        replay.run()
+        self.assertEqual(replay.server.a_records_cache['yandex.ru'][0], ['77.88.55.80', 1100 + 298])
+
 if __name__ == '__main__':
     unittest.main()